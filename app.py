@@ -1,70 +1,226 @@
 import argparse
+import asyncio
 import logging
 import signal
 import sys
-from http.server import HTTPServer, BaseHTTPRequestHandler
-from urllib.parse import urlparse, parse_qs
+from http import HTTPStatus
+from urllib.parse import urlparse, unquote_plus
 import json
-from datetime import datetime
+import html
+import time
 import http.client
+import functools
+from collections import deque, OrderedDict
 import threading
+import queue
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # Global variables
-logs = []
+logs = deque(maxlen=10000)  # Keep only the most recent entries for /logs
 verbose = False
 
+# Compact JSON encoding straight to bytes, using orjson when it is installed
+if orjson is not None:
+    dump_json = orjson.dumps
+else:
+    # json.dumps builds a new JSONEncoder per call when given separators, reuse one instead
+    _encode_json = json.JSONEncoder(separators=(",", ":")).encode
+
+    def dump_json(obj):
+        return _encode_json(obj).encode("utf-8")
+
 # Configure logging
 def configure_logging(verbose):
     log_level = logging.DEBUG if verbose else logging.INFO
     logging.basicConfig(level=log_level, format='%(message)s')
+    # Keep asyncio's own debug messages out of the request log in verbose mode
+    logging.getLogger("asyncio").setLevel(logging.WARNING)
+
+# Timestamp formatting, the "HH:MM:" and " dd-mm-YYYY" parts are cached and only rebuilt once a minute
+_timestamp_cache = (None, "", "")
+
+def format_timestamp():
+    global _timestamp_cache
+    now = int(time.time())
+    minute, head, tail = _timestamp_cache
+    if now // 60 != minute:
+        local = time.localtime(now)
+        head = time.strftime("%H:%M:", local)
+        tail = time.strftime(" %d-%m-%Y", local)
+        _timestamp_cache = (now // 60, head, tail)
+    return f"{head}{now % 60:02d}{tail}"
+
+# Display names of the common routes, others fall back to stripping the leading slash
+_route_display = {"/": "", "/logs": "logs", "/favicon.ico": "favicon.ico"}
 
 # Custom log handler
 def log_request(route, method, query_value=None, body=None, log_only_in_cli=False, client_address=""):
-    timestamp = datetime.now().strftime("%H:%M:%S %d-%m-%Y")
-    # Determine route display based on verbose and whether it's root
-    if route == "/":
-        route_name = "" if not verbose else f"{client_address}/"
-    else:
-        route_name = route.lstrip("/") if not verbose else f"{client_address}/{route.lstrip('/')}"
+    timestamp = format_timestamp()
+    # Determine route display, prefixed with the client address in verbose mode
+    route_name = _route_display.get(route)
+    if route_name is None:
+        route_name = route.lstrip("/")
+    if verbose:
+        route_name = f"{client_address}/{route_name}"
     
     log_entry = f"[+] {timestamp} ({method}) {route_name}"
 
     if query_value:
         log_entry += f" - {query_value}"
-    if body:
-        log_entry += f"\n{body}"
 
-    # CLI logging format
-    logging.info(log_entry)
+    # CLI logging format always, /logs logging format excludes favicon and /logs itself
+    to_web = not log_only_in_cli and route not in ["/favicon.ico", "/logs"]
+    log_queue.put_nowait((log_entry, body, True, to_web))
+
+# Log entries are queued by request handlers and written out in batches by a flusher thread
+log_queue = queue.SimpleQueue()
+LOG_BATCH_SIZE = 256
+_stdout_write = sys.stdout.write
+_stdout_flush = sys.stdout.flush
+
+def write_log_batch(batch):
+    cli_entries = []
+    for log_entry, body, to_cli, to_web in batch:
+        # Request bodies are queued as raw bytes and only decoded here, off the request path
+        if body:
+            log_entry += "\n" + body.decode("utf-8", errors="replace")
+        if to_cli:
+            cli_entries.append(log_entry)
+        # Escape once here so rendering /logs stays a plain join of trusted markup
+        if to_web:
+            log_entry_web = html.escape(log_entry.replace("[+]", ""), quote=False).replace("\n", "<br>")
+            logs.append(f'<div class="log-entry">{log_entry_web}</div>'.encode('utf-8'))
+    if cli_entries:
+        # One direct write and flush per batch, the logging machinery adds nothing for plain lines
+        try:
+            _stdout_write("\n".join(cli_entries) + "\n")
+            _stdout_flush()
+        except (OSError, ValueError):
+            # A closed pipe or unencodable text only costs the CLI lines, /logs already has them
+            pass
+
+def drain_log_queue(batch):
+    while len(batch) < LOG_BATCH_SIZE:
+        try:
+            batch.append(log_queue.get_nowait())
+        except queue.Empty:
+            break
+    return batch
+
+def log_flusher():
+    while True:
+        batch = drain_log_queue([log_queue.get()])
+        try:
+            write_log_batch(batch)
+        except Exception:
+            # One bad batch must not stop the thread, nothing else drains the queue
+            logging.exception("Failed to write log batch")
+
+def flush_logs():
+    # Write out whatever the flusher thread has not picked up yet
+    while batch := drain_log_queue([]):
+        write_log_batch(batch)
+
+# Idle keep-alive connections to forwarding targets, keyed by (scheme, netloc) in LRU order.
+# Targets come from clients, so both the number of targets and the total idle sockets are capped.
+connection_pool = OrderedDict()
+connection_pool_lock = threading.Lock()
+connection_pool_idle = 0
+POOL_MAXSIZE = 32  # idle connections kept per target
+POOL_MAX_TARGETS = 10  # targets with idle connections, least recently used evicted first
+POOL_MAX_IDLE = 64  # idle connections kept across all targets
 
-    # /logs logging format, exclude favicon and /logs itself from logs
-    if not log_only_in_cli and route not in ["/favicon.ico", "/logs"]:
-        log_entry_web = log_entry.replace("[+]", "").replace("\n", "<br>")
-        logs.append(log_entry_web)
+def _split_target(target):
+    target_parsed = urlparse(target)
+    path = target_parsed.path or "/"
+    path += "?" + target_parsed.query if target_parsed.query else ""
+    return (target_parsed.scheme, target_parsed.netloc), path
+
+_cached_split_target = functools.lru_cache(maxsize=256)(_split_target)
+
+def _normalize_target(target):
+    # Targets come from clients, only cache short ones to bound the memory held by the cache
+    return _cached_split_target(target) if len(target) < 256 else _split_target(target)
+
+def _acquire_connection(key):
+    global connection_pool_idle
+    with connection_pool_lock:
+        idle = connection_pool.get(key)
+        if idle:
+            conn = idle.pop()
+            connection_pool_idle -= 1
+            if not idle:
+                del connection_pool[key]
+            return conn, True
+    scheme, netloc = key
+    return (http.client.HTTPSConnection if scheme == "https"
+            else http.client.HTTPConnection)(netloc, timeout=5.0), False
+
+def _release_connection(key, conn, response):
+    global connection_pool_idle
+    evicted = []
+    if not response.will_close:
+        with connection_pool_lock:
+            idle = connection_pool.get(key)
+            if idle is None:
+                idle = connection_pool[key] = []
+            else:
+                connection_pool.move_to_end(key)
+            if len(idle) < POOL_MAXSIZE:
+                idle.append(conn)
+                connection_pool_idle += 1
+                conn = None
+                # Drop whole least recently used targets until both caps hold again,
+                # the current target is most recent and fits within POOL_MAX_IDLE alone
+                while len(connection_pool) > POOL_MAX_TARGETS or connection_pool_idle > POOL_MAX_IDLE:
+                    _, stale = connection_pool.popitem(last=False)
+                    connection_pool_idle -= len(stale)
+                    evicted.extend(stale)
+    # Close sockets outside the lock
+    if conn is not None:
+        conn.close()
+    for stale in evicted:
+        stale.close()
 
 # Function to parse target URL and send HTTP request
 def send_request_to_target(query, target):
     if not target.startswith("http://") and not target.startswith("https://"):
         target = "http://" + target
     try:
-        target_parsed = urlparse(target)
-        conn = (http.client.HTTPSConnection if target_parsed.scheme == "https" 
-                else http.client.HTTPConnection)(target_parsed.netloc)
-        path = target_parsed.path or "/"
-        path += "?" + target_parsed.query if target_parsed.query else ""
-        payload = json.dumps({"query": query}, separators=(",", ":"))
-        
-        conn.request("POST", path, body=payload, headers={"Content-Type": "application/json"})
-        response = conn.getresponse()
-        response_text = response.read().decode("utf-8")
-        conn.close()
-        return response_text
+        key, path = _normalize_target(target)
+        payload = dump_json({"query": query})
+
+        while True:
+            conn, reused = _acquire_connection(key)
+            try:
+                conn.request("POST", path, body=payload, headers={"Content-Type": "application/json"})
+                response = conn.getresponse()
+                response_text = response.read().decode("utf-8")
+            except ConnectionError:
+                conn.close()
+                # The target may have dropped an idle socket, retry on another one
+                if reused:
+                    continue
+                raise
+            except Exception:
+                conn.close()
+                raise
+            _release_connection(key, conn, response)
+            return response_text
     except Exception as e:
         return f"Failed to request {target}: {e}"
 
-# HTML template for log display
-def generate_logs_html():
-    return f"""
+# HTML template for log display, split around the log entries and encoded once at import
+HEAD_HTML = b"""
     <!DOCTYPE html>
     <html lang="en">
     <head>
@@ -72,25 +228,26 @@ def generate_logs_html():
         <meta name="viewport" content="width=device-width, initial-scale=1.0">
         <title>Receiver Web Server</title>
         <style>
-            body {{ font-family: Arial, sans-serif; background: #f4f4f9; padding: 10px; color: #333; }}
-            .header, .footer {{ text-align: center; padding: 10px; }}
-            .header {{ font-size: 24px; font-weight: bold; }}
-            .log-entry {{ background: #fff; padding: 10px; margin: 8px 0; border-radius: 8px; }}
-            #log-container {{ max-height: 70vh; overflow-y: auto; }}
-            .refresh-btn {{ padding: 5px 10px; cursor: pointer; margin-top: 10px; }}
-            @media (prefers-color-scheme: dark) {{
-                body {{ background: #1e1e1e; color: #ccc; }}
-                .log-entry {{ background: #333; color: #eee; }}
-                .footer {{ color: #888; }}
-                .refresh-btn {{ background-color: #444; color: #ccc; }}
-                .refresh-btn:hover {{ background-color: #555; }}
-            }}
+            body { font-family: Arial, sans-serif; background: #f4f4f9; padding: 10px; color: #333; }
+            .header, .footer { text-align: center; padding: 10px; }
+            .header { font-size: 24px; font-weight: bold; }
+            .log-entry { background: #fff; padding: 10px; margin: 8px 0; border-radius: 8px; }
+            #log-container { max-height: 70vh; overflow-y: auto; }
+            .refresh-btn { padding: 5px 10px; cursor: pointer; margin-top: 10px; }
+            @media (prefers-color-scheme: dark) {
+                body { background: #1e1e1e; color: #ccc; }
+                .log-entry { background: #333; color: #eee; }
+                .footer { color: #888; }
+                .refresh-btn { background-color: #444; color: #ccc; }
+                .refresh-btn:hover { background-color: #555; }
+            }
         </style>
     </head>
     <body>
         <div class="header">Receiver Web Server</div>
         <div id="log-container">
-            {''.join(f'<div class="log-entry">{log}</div>' for log in logs)}
+            """
+TAIL_HTML = b"""
         </div>
         <div style="text-align: center;">
             <button class="refresh-btn" onclick="location.reload();">Refresh</button>
@@ -100,86 +257,222 @@ def generate_logs_html():
     </html>
     """
 
-class RequestHandler(BaseHTTPRequestHandler):
-    def log_message(self, format, *args):
-        # Override to suppress default logging in HTTP server
-        pass
-
-    def do_GET(self):
-        parsed_path = urlparse(self.path)
-        client_address = f"{self.client_address[0]}:{self.server.server_port}" if verbose else ""
-
-        if parsed_path.path == "/favicon.ico":
-            log_request(parsed_path.path, self.command, log_only_in_cli=True, client_address=client_address)
-            self.send_response(404)
-            self.end_headers()
-        elif parsed_path.path == "/logs":
-            self.send_logs()
+LOGS_CHUNK_SIZE = 64 * 1024
+
+def generate_logs_html():
+    # Entries are stored as pre-encoded <div> blocks, the page is yielded in pieces of about
+    # LOGS_CHUNK_SIZE so it never has to be held in memory as a whole.
+    # Take a snapshot first so concurrent appends never race with the iteration.
+    snapshot = tuple(logs)
+    yield HEAD_HTML
+    chunk, size = [], 0
+    for entry in snapshot:
+        chunk.append(entry)
+        size += len(entry)
+        if size >= LOGS_CHUNK_SIZE:
+            yield b"".join(chunk)
+            chunk, size = [], 0
+    chunk.append(TAIL_HTML)
+    yield b"".join(chunk)
+
+# Memoized request parsers, clients tend to hit the same few paths repeatedly
+_cached_urlparse = functools.lru_cache(maxsize=2048)(urlparse)
+
+def _parse_path(path):
+    # Same length bound as the query cache, long request targets are parsed uncached
+    return _cached_urlparse(path) if len(path) < 256 else urlparse(path)
+
+def _extract_params(query):
+    # Single pass with parse_qs semantics, single values stay plain and repeated keys become lists
+    params = {}
+    for field in query.split("&"):
+        name, _, value = field.partition("=")
+        # Fields without "=" or with an empty value are dropped, as parse_qs does
+        if not value:
+            continue
+        name = unquote_plus(name)
+        value = unquote_plus(value)
+        if name not in params:
+            params[name] = value
+        elif isinstance(params[name], list):
+            params[name].append(value)
         else:
-            self.handle_home(parsed_path, client_address)
+            params[name] = [params[name], value]
+    return params
+
+_cached_extract_params = functools.lru_cache(maxsize=2048)(_extract_params)
+
+def _parse_query(query):
+    # Only cache short query strings to bound the memory held by the cache
+    return _cached_extract_params(query) if len(query) < 256 else _extract_params(query)
+
+class RequestHandler:
+    # Idle or slow clients would otherwise hold their connection open forever
+    timeout = 10
+    # Same header limit as http.server, which answers 431 past it
+    max_headers = 100
+
+    # Fixed responses, encoded once instead of formatting the status line and headers per request
+    _FAVICON_404 = b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+    _EMPTY_200 = b"HTTP/1.1 200 OK\r\nContent-type: text/plain\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.client_address = writer.get_extra_info("peername")
+        self.server_port = writer.get_extra_info("sockname")[1]
+        self.command = None
+        self.path = None
+        self.request_version = None
+        self.headers = {}
+
+    async def handle(self):
+        try:
+            if await self.parse_request():
+                method = getattr(self, f"do_{self.command}", None)
+                if method is None:
+                    self.send_response(501)
+                else:
+                    await method()
+            await self.writer.drain()
+        except ValueError:
+            # Oversized request line/header or malformed Content-Length
+            self.send_response(400)
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            pass
+        finally:
+            self.writer.close()
+
+    async def parse_request(self):
+        request_line = await asyncio.wait_for(self.reader.readline(), self.timeout)
+        words = request_line.decode("iso-8859-1").split()
+        if len(words) != 3:
+            if request_line:
+                self.send_response(400)
+            return False
+        self.command, self.path, self.request_version = words
+
+        header_count = 0
+        while True:
+            line = await asyncio.wait_for(self.reader.readline(), self.timeout)
+            if line in (b"\r\n", b"\n", b""):
+                break
+            header_count += 1
+            if header_count > self.max_headers:
+                self.send_response(431)
+                return False
+            name, _, value = line.decode("iso-8859-1").partition(":")
+            self.headers[name.strip().lower()] = value.strip()
+        return True
+
+    def send_response(self, status, content_type=None, body=b""):
+        header = f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+        if content_type:
+            header += f"Content-type: {content_type}\r\n"
+        header += f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n"
+        self.writer.write(header.encode("iso-8859-1") + body)
+
+    def client_label(self):
+        # Only shown in verbose log lines, so it is built on demand at the log call
+        return f"{self.client_address[0]}:{self.server_port}" if verbose else ""
+
+    async def do_GET(self):
+        parsed_path = _parse_path(self.path)
+        handler = self._GET_ROUTES.get(parsed_path.path, RequestHandler.handle_home)
+        await handler(self, parsed_path)
+
+    async def handle_favicon(self, parsed_path):
+        log_request(parsed_path.path, self.command, log_only_in_cli=True, client_address=self.client_label())
+        self.writer.write(self._FAVICON_404)
 
-    def do_POST(self):
-        length = int(self.headers.get('Content-Length', 0))
-        body = self.rfile.read(length).decode('utf-8')
-        parsed_path = urlparse(self.path)
-        client_address = f"{self.client_address[0]}:{self.server.server_port}" if verbose else ""
-        self.handle_home(parsed_path, client_address, body)
+    async def handle_logs(self, parsed_path):
+        await self.send_logs()
 
-    def handle_home(self, parsed_path, client_address, body=None):
+    # GET routes other than these fall through to handle_home
+    _GET_ROUTES = {"/favicon.ico": handle_favicon, "/logs": handle_logs}
+
+    async def do_POST(self):
+        length = int(self.headers.get("content-length", 0))
+        body = await asyncio.wait_for(self.reader.readexactly(length), self.timeout)
+        parsed_path = _parse_path(self.path)
+        await self.handle_home(parsed_path, body)
+
+    async def handle_home(self, parsed_path, body=None):
         # Process parameters only if path is root (`/`)
         if parsed_path.path == "/":
-            query_params = parse_qs(parsed_path.query)
-            query_json = {k: (v[0] if len(v) == 1 else v) for k, v in query_params.items()} if query_params else None
-            query_value = json.dumps(query_json, separators=(",", ":")) if query_json else ""
+            query_json = _parse_query(parsed_path.query) or None
+            query_bytes = dump_json(query_json) if query_json else b""
+            query_value = query_bytes.decode("utf-8")
         else:
             # If path is not root, treat it as a plain route without parsing query parameters
             query_value = None
             query_json = None
+            query_bytes = b""
 
         # Log request based on route and verbose mode
-        log_request(parsed_path.path, self.command, query_value=query_value or None, body=body, client_address=client_address)
+        log_request(parsed_path.path, self.command, query_value=query_value or None, body=body, client_address=self.client_label())
 
         # Handle specific parameters if they are present and on the root path
         if query_json and (("q" in query_json or "req" in query_json) and ("p" in query_json or "rep" in query_json)):
             query = query_json.get("q", query_json.get("req", ""))
             target = query_json.get("p", query_json.get("rep", ""))
             if target:
-                response_text = send_request_to_target(query, target)
-                self.send_response(200)
-                self.send_header("Content-type", "text/plain")
-                self.end_headers()
-                self.wfile.write(response_text.encode("utf-8"))
+                # Forwarding is blocking I/O, keep it off the event loop
+                response_text = await asyncio.to_thread(send_request_to_target, query, target)
+                self.send_response(200, "text/plain", response_text.encode("utf-8"))
                 return
 
-        response = query_value if query_value else ""
-        self.send_response(200)
-        self.send_header("Content-type", "application/json" if query_value else "text/plain")
-        self.end_headers()
-        self.wfile.write(response.encode('utf-8') if query_value else b'')
+        if not query_bytes:
+            self.writer.write(self._EMPTY_200)
+            return
 
-    def send_logs(self):
-        html_content = generate_logs_html()
-        self.send_response(200)
-        self.send_header("Content-type", "text/html")
-        self.end_headers()
-        self.wfile.write(html_content.encode('utf-8'))
+        self.send_response(200, "application/json", query_bytes)
 
-def run_server(ip, port):
-    server = HTTPServer((ip, port), RequestHandler)
+    async def send_logs(self):
+        if self.request_version == "HTTP/1.0":
+            # Chunked encoding needs HTTP/1.1, send the page with a Content-Length instead
+            self.send_response(200, "text/html", b"".join(generate_logs_html()))
+            return
+
+        self.writer.write(b"HTTP/1.1 200 OK\r\nContent-type: text/html\r\nTransfer-Encoding: chunked\r\n"
+                          b"Connection: close\r\n\r\n")
+        for piece in generate_logs_html():
+            self.writer.write(b"%X\r\n%s\r\n" % (len(piece), piece))
+            await self.writer.drain()
+        self.writer.write(b"0\r\n\r\n")
+
+async def serve(ip, port):
+    server = await asyncio.start_server(lambda reader, writer: RequestHandler(reader, writer).handle(), ip, port)
     print(f"Server running on {ip}:{port}")
-    server_thread = threading.Thread(target=server.serve_forever)
-    server_thread.start()
-
-    def shutdown_server(signum, frame):
-        print("\nShutting down the server gracefully...")
-        server.shutdown()
-        server_thread.join()
-        server.server_close()
-        print("Server shutdown completed.")
-        sys.exit(0)
-
-    signal.signal(signal.SIGINT, shutdown_server)
-    server_thread.join()
+
+    loop = asyncio.get_running_loop()
+    stop = loop.create_future()
+
+    def shutdown():
+        if not stop.done():
+            stop.set_result(None)
+
+    # Installed explicitly so SIGINT also works when it was inherited as ignored (nohup, `&`)
+    try:
+        loop.add_signal_handler(signal.SIGINT, shutdown)
+    except NotImplementedError:
+        # Event loops without add_signal_handler, e.g. on Windows
+        signal.signal(signal.SIGINT, lambda signum, frame: loop.call_soon_threadsafe(shutdown))
+
+    async with server:
+        await stop
+
+def run_server(ip, port):
+    # Escape characters the terminal cannot encode instead of failing the log write
+    sys.stdout.reconfigure(errors="backslashreplace")
+    threading.Thread(target=log_flusher, daemon=True).start()
+    # Prefer libuv's event loop when uvloop is installed
+    runner = uvloop.run if uvloop is not None else asyncio.run
+    runner(serve(ip, port))
+    flush_logs()
+    print("\nShutting down the server gracefully...")
+    print("Server shutdown completed.")
+    sys.exit(0)
 
 def main():
     global verbose
@@ -2,70 +2,223 @@ import argparse
 import logging
 import signal
 import sys
-from http.server import HTTPServer, BaseHTTPRequestHandler
-from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, unquote_plus
 import json
-from datetime import datetime
+import html
+import time
 import http.client
+import functools
+from collections import deque, OrderedDict
 import threading
+import queue
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # Global variables
-logs = []
+logs = deque(maxlen=10000)  # Keep only the most recent entries for /logs
 verbose = False
 
+# Compact JSON encoding straight to bytes, using orjson when it is installed
+if orjson is not None:
+    dump_json = orjson.dumps
+else:
+    # json.dumps builds a new JSONEncoder per call when given separators, reuse one instead
+    _encode_json = json.JSONEncoder(separators=(",", ":")).encode
+
+    def dump_json(obj):
+        return _encode_json(obj).encode("utf-8")
+
 # Configure logging
 def configure_logging(verbose):
     log_level = logging.DEBUG if verbose else logging.INFO
     logging.basicConfig(level=log_level, format='%(message)s')
 
+# Timestamp formatting, the "HH:MM:" and " dd-mm-YYYY" parts are cached and only rebuilt once a minute
+_timestamp_cache = (None, "", "")
+
+def format_timestamp():
+    global _timestamp_cache
+    now = int(time.time())
+    minute, head, tail = _timestamp_cache
+    if now // 60 != minute:
+        local = time.localtime(now)
+        head = time.strftime("%H:%M:", local)
+        tail = time.strftime(" %d-%m-%Y", local)
+        _timestamp_cache = (now // 60, head, tail)
+    return f"{head}{now % 60:02d}{tail}"
+
+# Display names of the common routes, others fall back to stripping the leading slash
+_route_display = {"/": "", "/logs": "logs", "/favicon.ico": "favicon.ico"}
+
 # Custom log handler
 def event_log(route, method, query_value=None, body=None, log_only_in_cli=False, client_address=""):
-    timestamp = datetime.now().strftime("%H:%M:%S %d-%m-%Y")
-    # Determine route display based on verbose and whether it's root
-    if route == "/":
-        route_name = "" if not verbose else f"{client_address}/"
-    else:
-        route_name = route.lstrip("/") if not verbose else f"{client_address}/{route.lstrip('/')}"
+    # CLI logging format, only log if verbose mode is on or not only for CLI
+    to_cli = verbose or not log_only_in_cli
+    # /logs logging format, exclude favicon and /logs itself from logs
+    to_web = not log_only_in_cli and route not in ["/favicon.ico", "/logs"]
+    if not to_cli and not to_web:
+        return
+
+    timestamp = format_timestamp()
+    # Determine route display, prefixed with the client address in verbose mode
+    route_name = _route_display.get(route)
+    if route_name is None:
+        route_name = route.lstrip("/")
+    if verbose:
+        route_name = f"{client_address}/{route_name}"
 
     log_entry = f"[+] {timestamp} ({method}) {route_name}"
 
     if query_value:
         log_entry += f" - {query_value}"
-    if body:
-        log_entry += f"\n{body}"
 
-    # CLI logging format, only log if verbose mode is on or not only for CLI
-    if verbose or not log_only_in_cli:
-        logging.info(log_entry)
+    log_queue.put_nowait((log_entry, body, to_cli, to_web))
 
-    # /logs logging format, exclude favicon and /logs itself from logs
-    if not log_only_in_cli and route not in ["/favicon.ico", "/logs"]:
-        log_entry_web = log_entry.replace("[+]", "").replace("\n", "<br>")
-        logs.append(log_entry_web)
+# Log entries are queued by request handlers and written out in batches by a flusher thread
+log_queue = queue.SimpleQueue()
+LOG_BATCH_SIZE = 256
+_stdout_write = sys.stdout.write
+_stdout_flush = sys.stdout.flush
+
+def write_log_batch(batch):
+    cli_entries = []
+    for log_entry, body, to_cli, to_web in batch:
+        # Request bodies are queued as raw bytes and only decoded here, off the request path
+        if body:
+            log_entry += "\n" + body.decode("utf-8", errors="replace")
+        if to_cli:
+            cli_entries.append(log_entry)
+        # Escape once here so rendering /logs stays a plain join of trusted markup
+        if to_web:
+            log_entry_web = html.escape(log_entry.replace("[+]", ""), quote=False).replace("\n", "<br>")
+            logs.append(f'<div class="log-entry">{log_entry_web}</div>'.encode('utf-8'))
+    if cli_entries:
+        # One direct write and flush per batch, the logging machinery adds nothing for plain lines
+        try:
+            _stdout_write("\n".join(cli_entries) + "\n")
+            _stdout_flush()
+        except (OSError, ValueError):
+            # A closed pipe or unencodable text only costs the CLI lines, /logs already has them
+            pass
+
+def drain_log_queue(batch):
+    while len(batch) < LOG_BATCH_SIZE:
+        try:
+            batch.append(log_queue.get_nowait())
+        except queue.Empty:
+            break
+    return batch
+
+def log_flusher():
+    while True:
+        batch = drain_log_queue([log_queue.get()])
+        try:
+            write_log_batch(batch)
+        except Exception:
+            # One bad batch must not stop the thread, nothing else drains the queue
+            logging.exception("Failed to write log batch")
+
+def flush_logs():
+    # Write out whatever the flusher thread has not picked up yet
+    while batch := drain_log_queue([]):
+        write_log_batch(batch)
+
+# Idle keep-alive connections to forwarding targets, keyed by (scheme, netloc) in LRU order.
+# Targets come from clients, so both the number of targets and the total idle sockets are capped.
+connection_pool = OrderedDict()
+connection_pool_lock = threading.Lock()
+connection_pool_idle = 0
+POOL_MAXSIZE = 32  # idle connections kept per target
+POOL_MAX_TARGETS = 10  # targets with idle connections, least recently used evicted first
+POOL_MAX_IDLE = 64  # idle connections kept across all targets
+
+def _split_target(target):
+    target_parsed = urlparse(target)
+    path = target_parsed.path or "/"
+    path += "?" + target_parsed.query if target_parsed.query else ""
+    return (target_parsed.scheme, target_parsed.netloc), path
+
+_cached_split_target = functools.lru_cache(maxsize=256)(_split_target)
+
+def _normalize_target(target):
+    # Targets come from clients, only cache short ones to bound the memory held by the cache
+    return _cached_split_target(target) if len(target) < 256 else _split_target(target)
+
+def _acquire_connection(key):
+    global connection_pool_idle
+    with connection_pool_lock:
+        idle = connection_pool.get(key)
+        if idle:
+            conn = idle.pop()
+            connection_pool_idle -= 1
+            if not idle:
+                del connection_pool[key]
+            return conn, True
+    scheme, netloc = key
+    return (http.client.HTTPSConnection if scheme == "https"
+            else http.client.HTTPConnection)(netloc, timeout=5.0), False
+
+def _release_connection(key, conn, response):
+    global connection_pool_idle
+    evicted = []
+    if not response.will_close:
+        with connection_pool_lock:
+            idle = connection_pool.get(key)
+            if idle is None:
+                idle = connection_pool[key] = []
+            else:
+                connection_pool.move_to_end(key)
+            if len(idle) < POOL_MAXSIZE:
+                idle.append(conn)
+                connection_pool_idle += 1
+                conn = None
+                # Drop whole least recently used targets until both caps hold again,
+                # the current target is most recent and fits within POOL_MAX_IDLE alone
+                while len(connection_pool) > POOL_MAX_TARGETS or connection_pool_idle > POOL_MAX_IDLE:
+                    _, stale = connection_pool.popitem(last=False)
+                    connection_pool_idle -= len(stale)
+                    evicted.extend(stale)
+    # Close sockets outside the lock
+    if conn is not None:
+        conn.close()
+    for stale in evicted:
+        stale.close()
 
 # Function to parse target URL and send HTTP request
 def forward_param(query, target):
     if not target.startswith("http://") and not target.startswith("https://"):
         target = "http://" + target
     try:
-        target_parsed = urlparse(target)
-        conn = (http.client.HTTPSConnection if target_parsed.scheme == "https" 
-                else http.client.HTTPConnection)(target_parsed.netloc)
-        path = target_parsed.path or "/"
-        path += "?" + target_parsed.query if target_parsed.query else ""
-        payload = json.dumps({"query": query}, separators=(",", ":"))
-
-        conn.request("POST", path, body=payload, headers={"Content-Type": "application/json"})
-        response = conn.getresponse()
-        response_text = response.read().decode("utf-8")
-        conn.close()
-        return response_text
+        key, path = _normalize_target(target)
+        payload = dump_json({"query": query})
+
+        while True:
+            conn, reused = _acquire_connection(key)
+            try:
+                conn.request("POST", path, body=payload, headers={"Content-Type": "application/json"})
+                response = conn.getresponse()
+                response_text = response.read().decode("utf-8")
+            except ConnectionError:
+                conn.close()
+                # The target may have dropped an idle socket, retry on another one
+                if reused:
+                    continue
+                raise
+            except Exception:
+                conn.close()
+                raise
+            _release_connection(key, conn, response)
+            return response_text
     except Exception as e:
         return f"Failed to request {target}: {e}"
 
-# HTML template for log display
-def logs_html():
-    return f"""
+# HTML template for log display, split around the log entries and encoded once at import
+HEAD_HTML = b"""
     <!DOCTYPE html>
     <html lang="en">
     <head>
@@ -73,25 +226,26 @@ def logs_html():
         <meta name="viewport" content="width=device-width, initial-scale=1.0">
         <title>Receiver Web Server</title>
         <style>
-            body {{ font-family: Arial, sans-serif; background: #f4f4f9; padding: 10px; color: #333; }}
-            .header, .footer {{ text-align: center; padding: 10px; }}
-            .header {{ font-size: 24px; font-weight: bold; }}
-            .log-entry {{ background: #fff; padding: 10px; margin: 8px 0; border-radius: 8px; }}
-            #log-container {{ max-height: 70vh; overflow-y: auto; }}
-            .refresh-btn {{ padding: 5px 10px; cursor: pointer; margin-top: 10px; }}
-            @media (prefers-color-scheme: dark) {{
-                body {{ background: #1e1e1e; color: #ccc; }}
-                .log-entry {{ background: #333; color: #eee; }}
-                .footer {{ color: #888; }}
-                .refresh-btn {{ background-color: #444; color: #ccc; }}
-                .refresh-btn:hover {{ background-color: #555; }}
-            }}
+            body { font-family: Arial, sans-serif; background: #f4f4f9; padding: 10px; color: #333; }
+            .header, .footer { text-align: center; padding: 10px; }
+            .header { font-size: 24px; font-weight: bold; }
+            .log-entry { background: #fff; padding: 10px; margin: 8px 0; border-radius: 8px; }
+            #log-container { max-height: 70vh; overflow-y: auto; }
+            .refresh-btn { padding: 5px 10px; cursor: pointer; margin-top: 10px; }
+            @media (prefers-color-scheme: dark) {
+                body { background: #1e1e1e; color: #ccc; }
+                .log-entry { background: #333; color: #eee; }
+                .footer { color: #888; }
+                .refresh-btn { background-color: #444; color: #ccc; }
+                .refresh-btn:hover { background-color: #555; }
+            }
         </style>
     </head>
     <body>
         <div class="header">Receiver Web Server</div>
         <div id="log-container">
-            {''.join(f'<div class="log-entry">{log}</div>' for log in logs)}
+            """
+TAIL_HTML = b"""
         </div>
         <div style="text-align: center;">
             <button class="refresh-btn" onclick="location.reload();">Refresh</button>
@@ -101,46 +255,116 @@ def logs_html():
     </html>
     """
 
+LOGS_CHUNK_SIZE = 64 * 1024
+
+def logs_html():
+    # Entries are stored as pre-encoded <div> blocks, the page is yielded in pieces of about
+    # LOGS_CHUNK_SIZE so it never has to be held in memory as a whole.
+    # Take a snapshot first so concurrent appends never race with the iteration.
+    snapshot = tuple(logs)
+    yield HEAD_HTML
+    chunk, size = [], 0
+    for entry in snapshot:
+        chunk.append(entry)
+        size += len(entry)
+        if size >= LOGS_CHUNK_SIZE:
+            yield b"".join(chunk)
+            chunk, size = [], 0
+    chunk.append(TAIL_HTML)
+    yield b"".join(chunk)
+
+# Memoized request parsers, clients tend to hit the same few paths repeatedly
+_cached_urlparse = functools.lru_cache(maxsize=2048)(urlparse)
+
+def _parse_path(path):
+    # Same length bound as the query cache, long request targets are parsed uncached
+    return _cached_urlparse(path) if len(path) < 256 else urlparse(path)
+
+def _extract_params(query):
+    # Single pass with parse_qs semantics, single values stay plain and repeated keys become lists
+    params = {}
+    for field in query.split("&"):
+        name, _, value = field.partition("=")
+        # Fields without "=" or with an empty value are dropped, as parse_qs does
+        if not value:
+            continue
+        name = unquote_plus(name)
+        value = unquote_plus(value)
+        if name not in params:
+            params[name] = value
+        elif isinstance(params[name], list):
+            params[name].append(value)
+        else:
+            params[name] = [params[name], value]
+    return params
+
+_cached_extract_params = functools.lru_cache(maxsize=2048)(_extract_params)
+
+def _parse_query(query):
+    # Only cache short query strings to bound the memory held by the cache
+    return _cached_extract_params(query) if len(query) < 256 else _extract_params(query)
+
 class RequestHandler(BaseHTTPRequestHandler):
+    # Idle clients would otherwise hold a pool worker forever
+    timeout = 10
+
+    protocol_version = "HTTP/1.0"
+
+    # Fixed responses, encoded once instead of formatting the status line and headers per request
+    _FAVICON_404 = f"{protocol_version} 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n".encode()
+    _EMPTY_200 = (f"{protocol_version} 200 OK\r\nContent-type: text/plain\r\nContent-Length: 0\r\n"
+                  "Connection: close\r\n\r\n").encode()
+
     def log_message(self, format, *args):
         # Override to suppress default logging in HTTP server
         pass
 
+    def send_fixed(self, response):
+        # HTTP/0.9 responses carry no status line or headers, and the fixed ones have no body
+        if self.request_version != "HTTP/0.9":
+            self.wfile.write(response)
+
+    def client_label(self):
+        # Only shown in verbose log lines, so it is built on demand at the log call
+        return f"{self.client_address[0]}:{self.server.server_port}" if verbose else ""
+
     def do_GET(self):
-        parsed_path = urlparse(self.path)
-        client_address = f"{self.client_address[0]}:{self.server.server_port}" if verbose else ""
-
-        if parsed_path.path in ["/favicon.ico", "/logs"]:
-            # Ensure that logs for /favicon.ico and /logs are generated in verbose mode only
-            event_log(parsed_path.path, self.command, log_only_in_cli=True, client_address=client_address)
-            if parsed_path.path == "/favicon.ico":
-                self.send_response(404)
-                self.end_headers()
-            elif parsed_path.path == "/logs":
-                self.send_logs()
-        else:
-            self.handle_main(parsed_path, client_address)
+        parsed_path = _parse_path(self.path)
+        handler = self._GET_ROUTES.get(parsed_path.path, RequestHandler.handle_main)
+        handler(self, parsed_path)
+
+    # Ensure that logs for /favicon.ico and /logs are generated in verbose mode only
+    def handle_favicon(self, parsed_path):
+        event_log(parsed_path.path, self.command, log_only_in_cli=True, client_address=self.client_label())
+        self.send_fixed(self._FAVICON_404)
+
+    def handle_logs(self, parsed_path):
+        event_log(parsed_path.path, self.command, log_only_in_cli=True, client_address=self.client_label())
+        self.send_logs()
+
+    # GET routes other than these fall through to handle_main
+    _GET_ROUTES = {"/favicon.ico": handle_favicon, "/logs": handle_logs}
 
     def do_POST(self):
         length = int(self.headers.get('Content-Length', 0))
-        body = self.rfile.read(length).decode('utf-8')
-        parsed_path = urlparse(self.path)
-        client_address = f"{self.client_address[0]}:{self.server.server_port}" if verbose else ""
-        self.handle_main(parsed_path, client_address, body)
+        body = self.rfile.read(length)
+        parsed_path = _parse_path(self.path)
+        self.handle_main(parsed_path, body)
 
-    def handle_main(self, parsed_path, client_address, body=None):
+    def handle_main(self, parsed_path, body=None):
         # Process parameters only if path is root (`/`)
         if parsed_path.path == "/":
-            query_params = parse_qs(parsed_path.query)
-            query_json = {k: (v[0] if len(v) == 1 else v) for k, v in query_params.items()} if query_params else None
-            query_value = json.dumps(query_json, separators=(",", ":")) if query_json else ""
+            query_json = _parse_query(parsed_path.query) or None
+            query_bytes = dump_json(query_json) if query_json else b""
+            query_value = query_bytes.decode("utf-8")
         else:
             # If path is not root, treat it as a plain route without parsing query parameters
             query_value = None
             query_json = None
+            query_bytes = b""
 
         # Log request based on route and verbose mode
-        event_log(parsed_path.path, self.command, query_value=query_value or None, body=body, client_address=client_address)
+        event_log(parsed_path.path, self.command, query_value=query_value or None, body=body, client_address=self.client_label())
 
         # Handle specific parameters if they are present and on the root path
         if query_json and (("q" in query_json or "req" in query_json) and ("p" in query_json or "rep" in query_json)):
@@ -154,48 +378,90 @@ class RequestHandler(BaseHTTPRequestHandler):
                 self.wfile.write(response_text.encode("utf-8"))
                 return
 
-        response = query_value if query_value else ""
+        if not query_bytes:
+            self.send_fixed(self._EMPTY_200)
+            return
+
         self.send_response(200)
-        self.send_header("Content-type", "application/json" if query_value else "text/plain")
+        self.send_header("Content-type", "application/json")
         self.end_headers()
-        self.wfile.write(response.encode('utf-8') if query_value else b'')
+        self.wfile.write(query_bytes)
 
     def send_logs(self):
-        html_content = logs_html()
-        self.send_response(200)
-        self.send_header("Content-type", "text/html")
-        self.end_headers()
-        self.wfile.write(html_content.encode('utf-8'))
+        if self.request_version == "HTTP/0.9":
+            # HTTP/0.9 responses are the bare body, without status line or headers
+            for piece in logs_html():
+                self.wfile.write(piece)
+            return
+
+        if self.request_version < "HTTP/1.1":
+            # Chunked encoding needs HTTP/1.1, send the page in a single write instead
+            html_content = b"".join(logs_html())
+            self.wfile.write(b"HTTP/1.0 200 OK\r\nContent-type: text/html\r\nContent-Length: %d\r\n"
+                             b"\r\n" % len(html_content) + html_content)
+            return
 
-def run(ip, port):
-    server = HTTPServer((ip, port), RequestHandler)
+        self.wfile.write(b"HTTP/1.1 200 OK\r\nContent-type: text/html\r\nTransfer-Encoding: chunked\r\n"
+                         b"Connection: close\r\n\r\n")
+        for piece in logs_html():
+            self.wfile.write(b"%X\r\n%s\r\n" % (len(piece), piece))
+        self.wfile.write(b"0\r\n\r\n")
+
+class PooledHTTPServer(ThreadingHTTPServer):
+    # socketserver's default listen backlog of 5 resets connections under bursts of clients
+    request_queue_size = 128
+
+    def __init__(self, server_address, RequestHandlerClass, workers):
+        super().__init__(server_address, RequestHandlerClass)
+        # Bounded pool of worker threads shared by all connections
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+
+    def process_request(self, request, client_address):
+        # Hand the connection to the pool instead of spawning a thread per request
+        self.executor.submit(self.process_request_thread, request, client_address)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(cancel_futures=True)
+
+def run(ip, port, workers):
+    # Escape characters the terminal cannot encode instead of failing the log write
+    sys.stdout.reconfigure(errors="backslashreplace")
+    threading.Thread(target=log_flusher, daemon=True).start()
+    server = PooledHTTPServer((ip, port), RequestHandler, workers)
     print(f"[-] Server running on {ip}:{port}")
-    server_thread = threading.Thread(target=server.serve_forever)
-    server_thread.start()
 
     def shutdown(signum, frame):
         print("\n[-] Shutting down the server")
-        server.shutdown()
-        server_thread.join()
-        server.server_close()
-        # print("[-] Server shutdown completed")
-        sys.exit(0)
+        # serve_forever runs on this thread, so it has to be stopped from another one
+        threading.Thread(target=server.shutdown).start()
 
     signal.signal(signal.SIGINT, shutdown)
-    server_thread.join()
+    server.serve_forever()
+    server.server_close()
+    flush_logs()
+    # print("[-] Server shutdown completed")
+    sys.exit(0)
+
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be a positive integer: {value}")
+    return number
 
 def main():
     global verbose
     parser = argparse.ArgumentParser(description="Receiver Web Server", usage="python main.py [options], use -h for help")
     parser.add_argument("-i", "--ip", default="0.0.0.0", help="IP address to bind")
     parser.add_argument("-p", "--port", type=int, default=80, help="Port number to bind")
+    parser.add_argument("-w", "--workers", type=positive_int, default=64, help="Number of worker threads")
     parser.add_argument("-v", "--verbose", action="store_true", help="Enable verbose logging")
     parser.add_argument("-V", "--version", action="version", version="Receiver Version 0.1.0", help="Show version")
     args = parser.parse_args()
 
     verbose = args.verbose
     configure_logging(verbose)
-    run(args.ip, args.port)
+    run(args.ip, args.port, args.workers)
 
 if __name__ == "__main__":
     main()